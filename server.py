@@ -12,14 +12,24 @@ import time
 import re
 import sys
 import tempfile
+import threading
+import functools
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Set
 import uuid
 from contextlib import contextmanager
+from collections import OrderedDict
 
 from mcp.server import FastMCP
 import httpx
+import numpy as np
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # Initialize MCP server
 mcp = FastMCP("claude-dementia-local")
@@ -33,6 +43,7 @@ class Config:
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
         self.db_path = os.getenv("CLAUDE_MEMORY_DB", ".claude-memory.db")
+        self.embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
 
 config = Config()
 
@@ -40,12 +51,51 @@ config = Config()
 # DATABASE SETUP (SQLite)
 # ============================================================================
 
+_local = threading.local()
+
 def get_db_connection():
-    """Get SQLite database connection"""
-    conn = sqlite3.connect(config.db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    """Get the SQLite connection for the current thread.
+
+    The connection is opened once per thread and reused across tool calls so
+    the page cache stays warm and we don't pay connect/schema parsing on every
+    request. Callers must not close it.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(config.db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        if config.db_path != ":memory:":
+            # WAL lets searches read while a store is committing; NORMAL is durable enough under WAL
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Serve reads from a memory map and a larger page cache (64 MiB)
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _local.conn = conn
     return conn
 
+@contextmanager
+def write_transaction(conn):
+    """Run a block of writes as one BEGIN IMMEDIATE ... COMMIT, rolling back on error.
+
+    Taking the write lock up front makes a concurrent writer wait out the busy
+    timeout instead of failing when a deferred transaction tries to upgrade.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+# Stemmed, diacritic-insensitive terms: "deploying" finds "deployed", "café" finds "cafe"
+FTS_TOKENIZE = "porter unicode61 remove_diacritics 2"
+# bm25 column weights (label, content)
+FTS_RANK = "bm25(10.0, 1.0)"
+
 def initialize_database():
     """Initialize database tables"""
     conn = get_db_connection()
@@ -70,6 +120,7 @@ def initialize_database():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             session_id TEXT NOT NULL,
             label TEXT NOT NULL,
+            version TEXT NOT NULL DEFAULT '1.0',
             content TEXT NOT NULL,
             content_hash TEXT NOT NULL,
             locked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -77,45 +128,245 @@ def initialize_database():
             metadata TEXT,
             embedding BLOB,
             embedding_model TEXT,
-            UNIQUE(session_id, label)
+            UNIQUE(session_id, label, version)
+        )
+    ''')
+
+    # Databases created before the version column existed need it (and a
+    # matching unique index) for store_memory's ON CONFLICT target
+    cursor.execute("PRAGMA table_info(context_locks)")
+    if 'version' not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE context_locks ADD COLUMN version TEXT NOT NULL DEFAULT '1.0'")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_context_locks_session_label_version ON context_locks(session_id, label, version)")
+
+    # Partial index for loading a session's embeddings: rows stored without one are never visited
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_locks_embedded ON context_locks(session_id, embedding_model) WHERE embedding IS NOT NULL")
+
+    # Content-addressed lookup of existing embeddings (see lookup_stored_embedding)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_context_locks_content_hash ON context_locks(content_hash)")
+
+    # Full-text index over memories (external content, kept in sync by triggers)
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'context_locks_fts'")
+    row = cursor.fetchone()
+    fts_exists = row is not None and FTS_TOKENIZE in row['sql']
+    if row is not None and not fts_exists:
+        # Tokenizer changed: drop the index, it is rebuilt from context_locks below
+        cursor.execute("DROP TABLE context_locks_fts")
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS context_locks_fts USING fts5(
+            label,
+            content,
+            content='context_locks',
+            content_rowid='id',
+            tokenize="{FTS_TOKENIZE}"
         )
     ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS context_locks_fts_insert AFTER INSERT ON context_locks BEGIN
+            INSERT INTO context_locks_fts(rowid, label, content) VALUES (new.id, new.label, new.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS context_locks_fts_delete AFTER DELETE ON context_locks BEGIN
+            INSERT INTO context_locks_fts(context_locks_fts, rowid, label, content) VALUES ('delete', old.id, old.label, old.content);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS context_locks_fts_update AFTER UPDATE OF label, content ON context_locks BEGIN
+            INSERT INTO context_locks_fts(context_locks_fts, rowid, label, content) VALUES ('delete', old.id, old.label, old.content);
+            INSERT INTO context_locks_fts(rowid, label, content) VALUES (new.id, new.label, new.content);
+        END
+    ''')
+    if not fts_exists:
+        # Index memories stored before the FTS table existed
+        cursor.execute("INSERT INTO context_locks_fts(context_locks_fts) VALUES('rebuild')")
+    
+    # Default ranking for ORDER BY rank: bm25 with label hits weighted above content hits
+    cursor.execute(f"INSERT INTO context_locks_fts(context_locks_fts, rank) VALUES('rank', '{FTS_RANK}')")
+    
+    # Merge the segments left by incremental trigger writes so MATCH walks one b-tree
+    cursor.execute("INSERT INTO context_locks_fts(context_locks_fts) VALUES('optimize')")
     
     conn.commit()
-    conn.close()
+
+    # Refresh planner statistics; the limit keeps ANALYZE cheap as the tables grow
+    conn.execute("PRAGMA analysis_limit=400")
+    conn.execute("ANALYZE")
 
 # Initialize on startup
 initialize_database()
 
+_FTS_TERM_RE = re.compile(r"\w+")
+
+def build_fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression (quoted prefix terms, OR-ed together)"""
+    terms = _FTS_TERM_RE.findall(text)
+    if not terms:
+        return None
+    # Prefix terms keep partial words matching ("deplo" finds "deployment") via the index
+    return " OR ".join(f'"{term}"*' for term in terms)
+
 # ============================================================================
 # EMBEDDING SERVICE (Ollama)
 # ============================================================================
 
-async def get_embedding(text: str) -> Optional[List[float]]:
-    """Generate embedding using Ollama"""
+# Recent embeddings keyed by (model, content digest), so repeated text skips Ollama
+_embedding_cache: "OrderedDict[tuple, List[float]]" = OrderedDict()
+EMBEDDING_CACHE_SIZE = 256
+
+def content_digest(text: str) -> bytes:
+    """BLAKE2b digest of text; its hex form is the stored content_hash"""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+async def get_embedding(text: str, digest: Optional[bytes] = None) -> Optional[List[float]]:
+    """
+    Generate embedding using Ollama (memoized for recently seen text).
+    
+    Pass the text's content_digest() if it is already known to avoid hashing it twice.
+    """
+    key = (config.embedding_model, digest or content_digest(text))
+    cached = _embedding_cache.get(key)
+    if cached is not None:
+        _embedding_cache.move_to_end(key)
+        return cached
+    
+    embedding = lookup_stored_embedding(key[1]) or await _request_embedding(text)
+    if embedding:
+        _embedding_cache[key] = embedding
+        if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    return embedding
+
+def lookup_stored_embedding(digest: bytes) -> Optional[List[float]]:
+    """Reuse the embedding of identical content already stored under any project or label"""
+    row = get_db_connection().execute(
+        "SELECT embedding FROM context_locks WHERE content_hash = ? AND embedding_model = ? AND embedding IS NOT NULL LIMIT 1",
+        (digest.hex(), config.embedding_model)
+    ).fetchone()
+    embedding = decode_embedding(row['embedding']) if row else None
+    return embedding.tolist() if embedding is not None else None
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared Ollama client for the running event loop, so requests reuse a keep-alive connection"""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient()
+        _http_client_loop = loop
+    return _http_client
+
+async def _request_embedding(text: str) -> Optional[List[float]]:
+    """Request an embedding from Ollama"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{config.ollama_base_url}/api/embeddings",
-                json={
-                    "model": config.embedding_model,
-                    "prompt": text
-                },
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                return response.json().get("embedding")
-            else:
-                print(f"Error getting embedding: {response.status_code} {response.text}", file=sys.stderr)
-                return None
+        response = await get_http_client().post(
+            f"{config.ollama_base_url}/api/embeddings",
+            json={
+                "model": config.embedding_model,
+                "prompt": text
+            },
+            timeout=10.0
+        )
+        if response.status_code == 200:
+            return _json_loads(response.content).get("embedding")
+        else:
+            print(f"Error getting embedding: {response.status_code} {response.text}", file=sys.stderr)
+            return None
     except Exception as e:
         print(f"Embedding error: {e}", file=sys.stderr)
         return None
 
+def encode_embedding(embedding: Optional[List[float]]) -> Optional[bytes]:
+    """Serialize an embedding for storage as packed float32 (4 bytes per dimension)"""
+    return np.asarray(embedding, dtype=np.float32).tobytes() if embedding else None
+
+@functools.lru_cache(maxsize=1024)
+def decode_embedding(raw) -> Optional[np.ndarray]:
+    """
+    Decode a stored embedding, memoized on the raw column value.
+    
+    Accepts packed float32 BLOBs and the JSON text written by earlier versions.
+    The returned array is read-only since it is shared through the cache.
+    """
+    try:
+        if isinstance(raw, bytes):
+            vector = np.frombuffer(raw, dtype=np.float32)
+        else:
+            vector = np.asarray(_json_loads(raw), dtype=np.float32)
+            vector.flags.writeable = False
+    except (TypeError, ValueError):
+        return None
+    return vector if vector.ndim == 1 and vector.size else None
+
+def load_embedding_index(conn, session_id: str):
+    """
+    Return (ids, matrix) for a session's embeddings, rows scaled to unit length.
+    
+    Cached per connection; the cache is dropped when another connection commits
+    (PRAGMA data_version) and per session when this connection stores memories.
+    Vectors from a different model aren't comparable, so they are left out.
+    """
+    probe = conn.cursor()
+    probe.row_factory = None
+    data_version = probe.execute("PRAGMA data_version").fetchone()[0]
+    cache = getattr(_local, "embedding_index", None)
+    if cache is None or _local.embedding_data_version != data_version:
+        cache = _local.embedding_index = {}
+        _local.embedding_data_version = data_version
+    
+    if session_id not in cache:
+        ids, vectors = [], []
+        for row in conn.execute("SELECT id, embedding FROM context_locks WHERE session_id = ? AND embedding IS NOT NULL AND embedding_model = ?",
+                                (session_id, config.embedding_model)):
+            emb = decode_embedding(row['embedding'])
+            if emb is not None:
+                ids.append(row['id'])
+                vectors.append(emb)
+        
+        matrix = np.array(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+        if len(ids):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        cache[session_id] = (ids, matrix)
+    
+    return cache[session_id]
+
+def invalidate_embedding_index(session_id: str):
+    """Drop this thread's cached embeddings for a session after writing to it"""
+    cache = getattr(_local, "embedding_index", None)
+    if cache is not None:
+        cache.pop(session_id, None)
+
 # ============================================================================
 # CORE TOOLS
 # ============================================================================
 
+@functools.lru_cache(maxsize=64)
+def get_session_id(project_path: str) -> str:
+    """Derive the local session id for a project path (computed once per path)"""
+    return f"local_{hashlib.md5(project_path.encode()).hexdigest()[:8]}"
+
+INSERT_SESSION_SQL = "INSERT OR IGNORE INTO sessions (id, started_at, last_active, project_path, project_name) VALUES (?, ?, ?, ?, ?)"
+
+UPSERT_MEMORY_SQL = """
+    INSERT INTO context_locks (session_id, label, version, content, content_hash, is_persistent, embedding, embedding_model)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(session_id, label, version) DO UPDATE SET
+    content = excluded.content,
+    content_hash = excluded.content_hash,
+    is_persistent = excluded.is_persistent,
+    embedding = excluded.embedding,
+    embedding_model = excluded.embedding_model,
+    locked_at = CURRENT_TIMESTAMP
+    WHERE content_hash IS NOT excluded.content_hash
+       OR is_persistent IS NOT excluded.is_persistent
+       OR embedding_model IS NOT excluded.embedding_model
+       OR (embedding IS NULL AND excluded.embedding IS NOT NULL)
+"""
+
 @mcp.tool()
 def get_status() -> str:
     """Get the current status of the memory server"""
@@ -141,38 +392,110 @@ async def store_memory(content: str, label: str, is_persistent: bool = False, pr
     
     project_path = project_path or os.getcwd()
     project_name = os.path.basename(project_path)
-    session_id = f"local_{hashlib.md5(project_path.encode()).hexdigest()[:8]}"
+    session_id = get_session_id(project_path)
     
-    # Ensure session exists
-    cursor.execute("INSERT OR IGNORE INTO sessions (id, started_at, last_active, project_path, project_name) VALUES (?, ?, ?, ?, ?)",
-                  (session_id, time.time(), time.time(), project_path, project_name))
+    # Use version 1.0 for lean mode
+    version = "1.0"
     
-    # Generate embedding
-    embedding = await get_embedding(content)
-    embedding_blob = json.dumps(embedding) if embedding else None
+    digest = content_digest(content)
+    content_hash = digest.hex()
     
-    content_hash = hashlib.md5(content.encode()).hexdigest()
+    # Unchanged content that already has an embedding from this model keeps it
+    cursor.execute("SELECT content_hash, embedding, embedding_model FROM context_locks WHERE session_id = ? AND label = ? AND version = ?",
+                   (session_id, label, version))
+    existing = cursor.fetchone()
+    if (existing and existing['content_hash'] == content_hash and existing['embedding'] is not None
+            and existing['embedding_model'] == config.embedding_model):
+        embedding_blob = existing['embedding']
+    else:
+        # Generate embedding before touching the database so the write lock is
+        # never held across the Ollama round-trip
+        embedding = await get_embedding(content, digest)
+        embedding_blob = encode_embedding(embedding)
     
     try:
-        # Use version 1.0 for lean mode
-        version = "1.0"
-        cursor.execute("""
-            INSERT INTO context_locks (session_id, label, version, content, content_hash, is_persistent, embedding, embedding_model)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(session_id, label, version) DO UPDATE SET
-            content = excluded.content,
-            content_hash = excluded.content_hash,
-            is_persistent = excluded.is_persistent,
-            embedding = excluded.embedding,
-            embedding_model = excluded.embedding_model,
-            locked_at = CURRENT_TIMESTAMP
-        """, (session_id, label, version, content, content_hash, is_persistent, embedding_blob, config.embedding_model))
-        conn.commit()
+        # Session upsert and memory upsert commit together in one transaction
+        with write_transaction(conn):
+            now = time.time()
+            cursor.execute(INSERT_SESSION_SQL, (session_id, now, now, project_path, project_name))
+            cursor.execute(UPSERT_MEMORY_SQL, (session_id, label, version, content, content_hash, is_persistent, embedding_blob, config.embedding_model))
+        invalidate_embedding_index(session_id)
         return f"Memory '{label}' stored successfully."
     except Exception as e:
         return f"Error storing memory: {str(e)}"
-    finally:
-        conn.close()
+
+# Labels bound per IN (...) lookup in store_memories
+LABEL_LOOKUP_CHUNK = 500
+
+@mcp.tool()
+async def store_memories(memories: List[Dict[str, Any]], is_persistent: bool = False, project_path: str = None) -> str:
+    """
+    Store several memories at once, committed in a single transaction.
+    
+    Args:
+        memories: List of objects with "content" and "label" keys
+        is_persistent: Whether these memories should persist across sessions (default: False)
+        project_path: Optional project path to associate with
+    """
+    for memory in memories:
+        if not isinstance(memory, dict):
+            return "Error storing memories: every memory must be an object with 'content' and 'label'."
+        content, label = memory.get("content"), memory.get("label")
+        if not isinstance(content, str) or not isinstance(label, str) or not content or not label:
+            return "Error storing memories: every memory needs a non-empty string 'content' and 'label'."
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    project_path = project_path or os.getcwd()
+    project_name = os.path.basename(project_path)
+    session_id = get_session_id(project_path)
+    
+    # Use version 1.0 for lean mode
+    version = "1.0"
+    
+    digests = [content_digest(memory["content"]) for memory in memories]
+    
+    # Stored rows for these labels, fetched in one query, so unchanged content keeps its embedding
+    # (chunked to stay under SQLite's bound-variable limit, 999 on older builds)
+    existing = {}
+    labels = [memory["label"] for memory in memories]
+    for start in range(0, len(labels), LABEL_LOOKUP_CHUNK):
+        chunk = labels[start:start + LABEL_LOOKUP_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(f"""
+            SELECT label, content_hash, embedding FROM context_locks
+            WHERE session_id = ? AND version = ? AND embedding IS NOT NULL AND embedding_model = ? AND label IN ({placeholders})
+        """, [session_id, version, config.embedding_model, *chunk])
+        existing.update((row['label'], row) for row in cursor)
+    
+    # Embed the rest concurrently, bounded so a large batch doesn't flood Ollama
+    semaphore = asyncio.Semaphore(max(1, config.embedding_concurrency))
+    
+    async def embedding_blob_for(memory: Dict[str, Any], digest: bytes) -> Optional[bytes]:
+        row = existing.get(memory["label"])
+        if row is not None and row['content_hash'] == digest.hex():
+            return row['embedding']
+        async with semaphore:
+            return encode_embedding(await get_embedding(memory["content"], digest))
+    
+    embedding_blobs = await asyncio.gather(*(embedding_blob_for(memory, digest) for memory, digest in zip(memories, digests)))
+    
+    rows = []
+    for memory, digest, embedding_blob in zip(memories, digests, embedding_blobs):
+        content = memory["content"]
+        content_hash = digest.hex()
+        rows.append((session_id, memory["label"], version, content, content_hash, is_persistent, embedding_blob, config.embedding_model))
+    
+    try:
+        with write_transaction(conn):
+            now = time.time()
+            cursor.execute(INSERT_SESSION_SQL, (session_id, now, now, project_path, project_name))
+            cursor.executemany(UPSERT_MEMORY_SQL, rows)
+        invalidate_embedding_index(session_id)
+        return f"Stored {len(rows)} memories successfully."
+    except Exception as e:
+        return f"Error storing memories: {str(e)}"
 
 @mcp.tool()
 def retrieve_memory(label: str, project_path: str = None) -> str:
@@ -181,11 +504,10 @@ def retrieve_memory(label: str, project_path: str = None) -> str:
     cursor = conn.cursor()
     
     project_path = project_path or os.getcwd()
-    session_id = f"local_{hashlib.md5(project_path.encode()).hexdigest()[:8]}"
+    session_id = get_session_id(project_path)
     
     cursor.execute("SELECT content FROM context_locks WHERE session_id = ? AND label = ?", (session_id, label))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return row['content']
@@ -197,11 +519,18 @@ async def search_memories(query: str, limit: int = 5, project_path: str = None)
     Search memories using vector similarity (if embeddings available) or text search.
     """
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
     project_path = project_path or os.getcwd()
-    session_id = f"local_{hashlib.md5(project_path.encode()).hexdigest()[:8]}"
+    session_id = get_session_id(project_path)
+    
+    # Nothing stored for this project: skip the embedding round-trip entirely.
+    # Plain tuple rows here; the probe doesn't need sqlite3.Row.
+    probe = conn.cursor()
+    probe.row_factory = None
+    probe.execute("SELECT 1 FROM context_locks WHERE session_id = ? LIMIT 1", (session_id,))
+    if probe.fetchone() is None:
+        return "No matching memories found."
     
     # Try vector search first
     query_embedding = await get_embedding(query)
@@ -210,34 +539,35 @@ async def search_memories(query: str, limit: int = 5, project_path: str = None)
     
     if query_embedding:
         # Naive vector search in Python (for "lean" implementation without vector extension)
-        # Fetch all memories for session with embeddings
-        cursor.execute("SELECT label, content, embedding FROM context_locks WHERE session_id = ? AND embedding IS NOT NULL", (session_id,))
-        rows = cursor.fetchall()
-        
-        import numpy as np
-        
-        def cosine_similarity(v1, v2):
-            return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
-        
-        scored_results = []
-        for row in rows:
-            try:
-                emb = json.loads(row['embedding'])
-                score = cosine_similarity(query_embedding, emb)
-                scored_results.append((score, row['label'], row['content']))
-            except:
-                continue
-        
-        scored_results.sort(key=lambda x: x[0], reverse=True)
-        results = [f"[{label}] (Score: {score:.2f})\n{content[:200]}..." for score, label, content in scored_results[:limit]]
+        # Score against the cached embedding matrix, then load label/content for the winners only
+        ids, matrix = load_embedding_index(conn, session_id)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector)
+        top = []
+        if ids and matrix.shape[1] == query_vector.shape[0] and query_norm > 0:
+            scores = matrix @ (query_vector / query_norm)
+            k = min(limit, len(ids))
+            best = np.argpartition(-scores, k - 1)[:k] if k > 0 else []
+            top = sorted(((float(scores[i]), ids[i]) for i in best), reverse=True)
+        if top:
+            placeholders = ",".join("?" * len(top))
+            cursor.execute(f"SELECT id, label, substr(content, 1, 200) AS preview FROM context_locks WHERE id IN ({placeholders})", [memory_id for _, memory_id in top])
+            by_id = {row['id']: row for row in cursor.fetchall()}
+            results = [f"[{by_id[memory_id]['label']}] (Score: {score:.2f})\n{by_id[memory_id]['preview']}..." for score, memory_id in top if memory_id in by_id]
     
-    # Fallback to text search if no results or no embedding
-    if not results:
-        cursor.execute("SELECT label, content FROM context_locks WHERE session_id = ? AND content LIKE ? LIMIT ?", (session_id, f"%{query}%", limit))
+    # Fallback to full-text search if no results or no embedding
+    fts_query = build_fts_query(query)
+    if not results and fts_query:
+        cursor.execute("""
+            SELECT cl.label, substr(cl.content, 1, 200) AS preview
+            FROM context_locks_fts
+            JOIN context_locks cl ON cl.id = context_locks_fts.rowid
+            WHERE context_locks_fts MATCH ? AND cl.session_id = ?
+            ORDER BY context_locks_fts.rank
+            LIMIT ?
+        """, (fts_query, session_id, limit))
         rows = cursor.fetchall()
-        results = [f"[{row['label']}]\n{row['content'][:200]}..." for row in rows]
-        
-    conn.close()
+        results = [f"[{row['label']}]\n{row['preview']}..." for row in rows]
     
     if not results:
         return "No matching memories found."